@@ -41,18 +41,23 @@ from powerapi.cli.generator import ReportModifierGenerator, PullerGenerator, Pus
 from powerapi.message import DispatcherStartMessage
 from powerapi.report import HWPCReport, PowerReport
 from powerapi.dispatch_rule import HWPCDispatchRule, HWPCDepthLevel
-from powerapi.filter import Filter
 from powerapi.actor import InitializationException, PowerAPIException
-from powerapi.supervisor import Supervisor
+from powerapi.supervisor import Supervisor, SIMPLE_SYSTEM_IMP, MULTI_PROC_QUEUE_IMP, MULTI_PROC_TCP_IMP
 
 from smartwatts import __version__ as smartwatts_version
 from smartwatts.report import FormulaReport
+from smartwatts.database import SmartwattsMongoDB, BufferedMongoDB
 from smartwatts.dispatcher import SmartwattsDispatcherActor
+from smartwatts.filter import SmartwattsFilter
+from smartwatts.pusher import SmartwattsPusherActor
 from smartwatts.actor import SmartWattsFormulaActor, SmartwattsValues
 from smartwatts.context import SmartWattsFormulaScope, SmartWattsFormulaConfig
 from smartwatts.topology import CPUTopology
 
 
+ACTOR_SYSTEM_AUTO = 'auto'
+
+
 def generate_smartwatts_parser():
     """
     Construct and returns the SmartWatts cli parameters parser.
@@ -60,6 +65,12 @@ def generate_smartwatts_parser():
     """
     parser = CommonCLIParser()
 
+    # Default the actor system to a sentinel so an explicitly selected implementation can be told apart and always respected
+    parser.args['actor_system'].default_value = ACTOR_SYSTEM_AUTO
+    parser.cli_parser.default_values['actor_system'] = ACTOR_SYSTEM_AUTO
+    parser.args['actor_system'].help = 'choose actor system implementation: multiprocQueueBase, multiprocTCPBase, simpleSystemBase ' \
+                                       'or auto (default, picks multiprocQueueBase when both formulas are enabled, simpleSystemBase otherwise)'
+
     # Formula control parameters
     parser.add_argument('disable-cpu-formula', help='Disable CPU formula', flag=True, type=bool, default=False, action=store_true)
     parser.add_argument('disable-dram-formula', help='Disable DRAM formula', flag=True, type=bool, default=False, action=store_true)
@@ -82,6 +93,10 @@ def generate_smartwatts_parser():
     # Sensor information
     parser.add_argument('sensor-report-sampling-interval', help='The frequency with which measurements are made (in milliseconds)', type=int, default=1000)
 
+    # MongoDB input tuning parameters
+    parser.add_argument('mongodb-batch-size', help='Maximum amount of documents returned per batch by the MongoDB input', type=int, default=500)
+    parser.add_argument('mongodb-max-await-ms', help='Maximum time (in milliseconds) the MongoDB input waits for new documents', type=int, default=500)
+
     # Learning parameters
     parser.add_argument('learn-min-samples-required', help='Minimum amount of samples required before trying to learn a power model', type=int, default=10)
     parser.add_argument('learn-history-window-size', help='Size of the history window used to keep samples to learn from', type=int, default=60)
@@ -89,11 +104,28 @@ def generate_smartwatts_parser():
     return parser
 
 
-def filter_rule(_):
+def select_actor_system(fconf):
     """
-    Rule of filter. Here none
+    Select the actor system implementation to use for the supervisor.
+    An explicitly selected actor system is always respected. With the default 'auto' selection,
+    when both the CPU and DRAM formulas are enabled, the single-process actor system makes them
+    contend for the GIL on every report; run each actor in its own OS process instead.
+    :param fconf: Global configuration
+    :return: Name of the actor system implementation to use
     """
-    return True
+    actor_system = fconf.get('actor_system', ACTOR_SYSTEM_AUTO)
+
+    if actor_system == ACTOR_SYSTEM_AUTO:
+        if not fconf['disable-cpu-formula'] and not fconf['disable-dram-formula']:
+            logging.info('CPU and DRAM formulas are both enabled, using the %s actor system to run them in separate processes', MULTI_PROC_QUEUE_IMP)
+            return MULTI_PROC_QUEUE_IMP
+        return SIMPLE_SYSTEM_IMP
+
+    if actor_system == MULTI_PROC_TCP_IMP:
+        # honor the explicit selection, but the actors all run on the local host where queues avoid the TCP stack traversal per message
+        logging.info('SmartWatts actors all run on the local host, consider using the %s actor system instead of %s', MULTI_PROC_QUEUE_IMP, MULTI_PROC_TCP_IMP)
+
+    return actor_system
 
 
 def setup_cpu_formula_actor(supervisor, fconf, route_table, report_filter, cpu_topology, formula_pushers, power_pushers):
@@ -114,7 +146,7 @@ def setup_cpu_formula_actor(supervisor, fconf, route_table, report_filter, cpu_t
                                                       SmartwattsValues(formula_pushers, power_pushers,
                                                                        formula_config), route_table, 'cpu')
     cpu_dispatcher = supervisor.launch(SmartwattsDispatcherActor, dispatcher_start_message)
-    report_filter.filter(filter_rule, cpu_dispatcher)
+    report_filter.filter_type(HWPCReport, cpu_dispatcher)
 
 
 def setup_dram_formula_actor(supervisor, fconf, route_table, report_filter, cpu_topology, formula_pushers, power_pushers):
@@ -143,7 +175,7 @@ def setup_dram_formula_actor(supervisor, fconf, route_table, report_filter, cpu_
                                                                        power_pushers, formula_config),
                                                       route_table, 'dram')
     dram_dispatcher = supervisor.launch(SmartwattsDispatcherActor, dispatcher_start_message)
-    report_filter.filter(filter_rule, dram_dispatcher)
+    report_filter.filter_type(HWPCReport, dram_dispatcher)
 
 
 def run_smartwatts(args) -> None:
@@ -165,11 +197,11 @@ def run_smartwatts(args) -> None:
 
     cpu_topology = CPUTopology(fconf['cpu-tdp'], fconf['cpu-base-clock'], fconf['cpu-frequency-min'], fconf['cpu-frequency-base'], fconf['cpu-frequency-max'])
 
-    report_filter = Filter()
+    report_filter = SmartwattsFilter()
 
     report_modifier_list = ReportModifierGenerator().generate(fconf)
 
-    supervisor = Supervisor(args['verbose'], args['actor_system'])
+    supervisor = Supervisor(args['verbose'], select_actor_system(fconf))
 
     def term_handler(_, __):
         supervisor.shutdown()
@@ -182,17 +214,19 @@ def run_smartwatts(args) -> None:
 
         pusher_generator = PusherGenerator()
         pusher_generator.add_model_factory('FormulaReport', FormulaReport)
+        pusher_generator.db_factory['mongodb'] = lambda db_config: BufferedMongoDB(db_config['model'], db_config['uri'],
+                                                                                   db_config['db'], db_config['collection'])
         pushers_info = pusher_generator.generate(args)
         pushers_formula = {}
         pushers_power = {}
 
         for pusher_name in pushers_info:
-            pusher_cls, pusher_start_message = pushers_info[pusher_name]
+            _, pusher_start_message = pushers_info[pusher_name]
 
             if pusher_start_message.database.report_type == PowerReport:
-                pushers_power[pusher_name] = supervisor.launch(pusher_cls, pusher_start_message)
+                pushers_power[pusher_name] = supervisor.launch(SmartwattsPusherActor, pusher_start_message)
             elif pusher_start_message.database.report_type == FormulaReport:
-                pushers_formula[pusher_name] = supervisor.launch(pusher_cls, pusher_start_message)
+                pushers_formula[pusher_name] = supervisor.launch(SmartwattsPusherActor, pusher_start_message)
             else:
                 raise InitializationException("Pusher parameters : Provide supported report type as model for pusher")
 
@@ -206,7 +240,14 @@ def run_smartwatts(args) -> None:
             logging.info('DRAM formula parameters: RAPL_REF=%s ERROR_THRESHOLD=%sW' % (fconf['dram-rapl-ref-event'], fconf['dram-error-threshold']))
             setup_dram_formula_actor(supervisor, fconf, route_table, report_filter, cpu_topology, pushers_formula, pushers_power)
 
-        pullers_info = PullerGenerator(report_filter, report_modifier_list).generate(args)
+        def mongodb_puller_factory(db_config):
+            return SmartwattsMongoDB(db_config['model'], db_config['uri'], db_config['db'], db_config['collection'],
+                                     batch_size=fconf.get('mongodb-batch-size', 500),
+                                     max_await_time_ms=fconf.get('mongodb-max-await-ms', 500))
+
+        puller_generator = PullerGenerator(report_filter, report_modifier_list)
+        puller_generator.db_factory['mongodb'] = mongodb_puller_factory
+        pullers_info = puller_generator.generate(args)
         for puller_name in pullers_info:
             puller_cls, puller_start_message = pullers_info[puller_name]
             supervisor.launch(puller_cls, puller_start_message)
@@ -247,6 +288,10 @@ class SmartwattsConfigValidator(ConfigValidator):
             config['cpu-base-clock'] = 100
         if 'sensor-report-sampling-interval' not in config:
             config['sensor-report-sampling-interval'] = 1000
+        if 'mongodb-batch-size' not in config:
+            config['mongodb-batch-size'] = 500
+        if 'mongodb-max-await-ms' not in config:
+            config['mongodb-max-await-ms'] = 500
         if 'learn-min-samples-required' not in config:
             config['learn-min-samples-required'] = 10
         if 'learn-history-window-size' not in config:
@@ -27,9 +27,12 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 from typing import Dict
-from collections import OrderedDict, defaultdict
+from collections import Counter, deque
 from math import ldexp, fabs
+from operator import itemgetter
+from sys import intern
 
+import numpy as np
 from thespian.actors import ActorAddress
 from sklearn.exceptions import NotFittedError
 
@@ -42,6 +45,41 @@ from .context import SmartWattsFormulaConfig
 from .formula import SmartWattsFormula
 from .carbon import Carbon
 
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        """
+        Pass-through replacement of the numba njit decorator used when numba is not available. (e.g. when running on PyPy)
+        """
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+
+        def decorator(func):
+            return func
+        return decorator
+
+
+@njit(cache=True, fastmath=True)
+def _aggregate_core_events(events_matrix):
+    """
+    Aggregate the Core events values of an events matrix into a single vector.
+    :param events_matrix: Matrix of Core events values (one row per CPU or per target)
+    :return: A vector containing the sum of the events values of each column
+    """
+    return events_matrix.sum(axis=0)
+
+
+@njit(cache=True, fastmath=True)
+def _compute_rapl_power(rapl_energy, reports_frequency):
+    """
+    Convert a raw RAPL energy sample into an average power over the sampling interval.
+    :param rapl_energy: Raw RAPL energy counter value
+    :param reports_frequency: Frequency at which the reports are sent (in milliseconds)
+    :return: Average power of the sampling interval (in Watt)
+    """
+    return ldexp(rapl_energy, -32) / (reports_frequency / 1000)
+
 
 class SmartwattsValues(FormulaValues):
     """
@@ -67,23 +105,48 @@ class SmartWattsFormulaActor(AbstractCpuDramFormula):
 
         self.config = None
         self.ticks = None
+        self.ticks_index = None
         self.formula = None
         self.formula_pushers = None
         self.real_time_mode = None
         self.carbon = None
         self.embodied_emission = None
+        self.event_index = None
+        self.events_getter = None
+        self.msr_events_names = None
+        self.power_reports_buffer = None
+        self.formula_reports_buffer = None
+        self.flush_threshold = None
+        self.max_pending_ticks = None
+        self.power_report_metadata_template = None
 
     def _initialization(self, message: FormulaStartMessage):
         AbstractCpuDramFormula._initialization(self, message)
         self.config = message.values.config
         self.formula_pushers = message.values.formula_pushers
-        self.ticks = OrderedDict()
+        self.ticks = deque()
+        self.ticks_index = {}
         self.formula = SmartWattsFormula(self.config.cpu_topology, self.config.history_window_size)
         self.carbon = Carbon()
         self.embodied_emission = 0
 
         self.real_time_mode = self.config.real_time_mode
 
+        # in real-time mode the reports are flushed as soon as they are generated to keep the latency low.
+        self.power_reports_buffer = []
+        self.formula_reports_buffer = []
+        self.flush_threshold = 1 if self.real_time_mode else self.config.flush_threshold
+
+        # amount of ticks to hold back before processing the oldest one.
+        # we wait before processing the ticks in order to mitigate the possible delay of the sensor/database.
+        self.max_pending_ticks = 2 if self.real_time_mode else 5
+
+        # these values are invariant for the lifetime of the formula, build the metadata template once.
+        self.power_report_metadata_template = {
+            'scope': self.config.scope.value,
+            'socket': self.socket,
+        }
+
     def receiveMsg_HWPCReport(self, message: HWPCReport, _):
         """
         Process a HWPC report and send the result(s) to a pusher actor.
@@ -93,48 +156,62 @@ class SmartWattsFormulaActor(AbstractCpuDramFormula):
         :raise: UnknowMessageTypeException when the given message is not an HWPCReport
         """
         self.log_debug('received message ' + str(message))
-        self.ticks.setdefault(message.timestamp, {}).update({message.target: message})
-
-        # start to process the oldest tick only after receiving at least 5 ticks.
-        # we wait before processing the ticks in order to mitigate the possible delay of the sensor/database.
-        if self.real_time_mode:
-            if len(self.ticks) > 2:
-                power_reports, formula_reports = self._process_oldest_tick()
-                for report in power_reports:
-                    for name, pusher in self.pushers.items():
-                        self.send(pusher, report)
-                        self.log_debug('send ' + str(report) + ' to ' + name)
-                for report in formula_reports:
-                    for name, pusher in self.formula_pushers.items():
-                        self.send(pusher, report)
-                        self.log_debug('send ' + str(report) + ' to ' + name)
-
-        else:
-            if len(self.ticks) > 5:
-                power_reports, formula_reports = self._process_oldest_tick()
-                for report in power_reports:
-                    for name, pusher in self.pushers.items():
-                        self.send(pusher, report)
-                        self.log_debug('send ' + str(report) + ' to ' + name)
-                for report in formula_reports:
-                    for name, pusher in self.formula_pushers.items():
-                        self.send(pusher, report)
-                        self.log_debug('send ' + str(report) + ' to ' + name)
+        tick = self.ticks_index.get(message.timestamp)
+        if tick is None:
+            tick = {}
+            self.ticks.append((message.timestamp, tick))
+            self.ticks_index[message.timestamp] = tick
+        tick[message.target] = message
+
+        # start to process the oldest tick only once enough ticks are pending.
+        if len(self.ticks) > self.max_pending_ticks:
+            power_reports, formula_reports = self._process_oldest_tick()
+            self._buffer_reports(power_reports, formula_reports)
 
     def receiveMsg_EndMessage(self, message: EndMessage, sender: ActorAddress):
         """
-        when receiving a EndMessage kill itself and send an EndMessage to all formula pushers
+        when receiving a EndMessage flush the pending reports, kill itself and send an EndMessage to all formula pushers
         """
+        self._flush_reports()
         AbstractCpuDramFormula.receiveMsg_EndMessage(self, message, sender)
         for _, pusher in self.formula_pushers.items():
             self.send(pusher, EndMessage(self.name))
 
+    def _buffer_reports(self, power_reports, formula_reports):
+        """
+        Buffer the reports of a processed tick and flush them to the pushers once the flush threshold is reached.
+        :param power_reports: Power reports of the processed tick
+        :param formula_reports: Formula reports of the processed tick
+        """
+        self.power_reports_buffer.extend(power_reports)
+        self.formula_reports_buffer.extend(formula_reports)
+
+        if len(self.power_reports_buffer) + len(self.formula_reports_buffer) >= self.flush_threshold:
+            self._flush_reports()
+
+    def _flush_reports(self):
+        """
+        Send the buffered reports to the pushers and clear the buffers.
+        """
+        for report in self.power_reports_buffer:
+            for name, pusher in self.pushers.items():
+                self.send(pusher, report)
+                self.log_debug('send ' + str(report) + ' to ' + name)
+        self.power_reports_buffer.clear()
+
+        for report in self.formula_reports_buffer:
+            for name, pusher in self.formula_pushers.items():
+                self.send(pusher, report)
+                self.log_debug('send ' + str(report) + ' to ' + name)
+        self.formula_reports_buffer.clear()
+
     def _process_oldest_tick(self):
         """
         Process the oldest tick stored in the stack and generate power reports for the running target(s).
         :return: Power reports of the running target(s)
         """
-        timestamp, hwpc_reports = self.ticks.popitem(last=False)
+        timestamp, hwpc_reports = self.ticks.popleft()
+        del self.ticks_index[timestamp]
 
         # reports of the current tick
         power_reports = []
@@ -152,10 +229,10 @@ class SmartWattsFormulaActor(AbstractCpuDramFormula):
         global_core = self._gen_agg_core_report_from_running_targets(hwpc_reports)
 
         # compute RAPL power report
-        rapl_power = rapl[self.config.rapl_event]
+        rapl_power = _compute_rapl_power(rapl[self.config.rapl_event], self.config.reports_frequency)
         power_reports.append(self._gen_power_report(timestamp, 'rapl', self.config.rapl_event, 0.0, rapl_power, 1.0, {}))
 
-        if not global_core:
+        if global_core is None:
             return power_reports, formula_reports
 
         # fetch power model to use
@@ -233,38 +310,27 @@ class SmartWattsFormulaActor(AbstractCpuDramFormula):
         :param power: Power estimation
         :return: Power report filled with the given parameters
         """
-        metadata.update({
-            'scope': self.config.scope.value,
-            'socket': self.socket,
-            'formula': formula,
-            'ratio': ratio,
-            'predict': raw_power,
-            'embodied_emission': self.embodied_emission,
-        })
+        report_metadata = self.power_report_metadata_template.copy()
+        report_metadata.update(metadata)
+        report_metadata['formula'] = formula
+        report_metadata['ratio'] = ratio
+        report_metadata['predict'] = raw_power
+        report_metadata['embodied_emission'] = self.embodied_emission
         sci = self._gen_sci(power)
-        print("*"*20)
-        print(sci)
-        print("*"*20)
-        return PowerReport(timestamp, self.sensor, target, power, self.carbon.emission, sci, metadata)
+        return PowerReport(timestamp, self.sensor, target, power, self.carbon.emission, sci, report_metadata)
 
     def _gen_sci(self, power):
-        print(power)
-        print(type(power))
-
-        print(self.carbon.emission)
-        print(type(self.carbon.emission))
-        sci = ((power * self.carbon.emission) + self.embodied_emission)
-        return sci
+        return (power * self.carbon.emission) + self.embodied_emission
 
     def _gen_rapl_events_group(self, system_report):
         """
-        Generate an events group with the RAPL reference event converted in Watts for the current socket.
+        Generate an events group with the raw RAPL reference event for the current socket.
+        The energy counter is kept as an integer, it is converted into Watts only when the power value is needed.
         :param system_report: The HWPC report of the System target
-        :return: A dictionary containing the RAPL reference event with its value converted in Watts
+        :return: A dictionary containing the RAPL reference event with its raw energy counter value
         """
         cpu_events = next(iter(system_report.groups['rapl'][str(self.socket)].values()))
-        energy = ldexp(cpu_events[self.config.rapl_event], -32) / (self.config.reports_frequency / 1000)
-        return {self.config.rapl_event: energy}
+        return {self.config.rapl_event: cpu_events[self.config.rapl_event]}
 
     def _gen_msr_events_group(self, system_report):
         """
@@ -272,37 +338,74 @@ class SmartWattsFormulaActor(AbstractCpuDramFormula):
         :param system_report: The HWPC report of the System target
         :return: A dictionary containing the average of the MSR counters
         """
-        msr_events_group = defaultdict(int)
-        msr_events_count = defaultdict(int)
+        msr_events_group = Counter()
+        msr_events_count = Counter()
         for _, cpu_events in system_report.groups['msr'][str(self.socket)].items():
-            for event_name, event_value in {k: v for k, v in cpu_events.items() if not k.startswith('time_')}.items():
-                msr_events_group[event_name] += event_value
-                msr_events_count[event_name] += 1
+            if self.msr_events_names is None:
+                self.msr_events_names = frozenset(intern(k) for k in cpu_events.keys() if not k.startswith('time_'))
+            msr_events_group.update({name: cpu_events[name] for name in self.msr_events_names})
+            msr_events_count.update(self.msr_events_names)
         return {k: (v / msr_events_count[k]) for k, v in msr_events_group.items()}
 
+    def _gen_event_index(self, cpu_events):
+        """
+        Generate the event name to column index mapping used to store the Core events in a matrix.
+        The columns are ordered by event name to stay consistent with the power models input layout.
+        The event names are interned so subsequent lookups hash a single shared string object.
+        :param cpu_events: Events of any CPU of the first received report
+        :return: A dictionary mapping each Core event name to its column index
+        """
+        return {intern(name): column for column, name in enumerate(sorted(k for k in cpu_events.keys() if not k.startswith('time_')))}
+
+    @staticmethod
+    def _gen_events_getter(event_index):
+        """
+        Generate an extractor specialized for the learned event schema.
+        itemgetter resolves the event names in C, removing the Python loop over the keys for every CPU.
+        :param event_index: Event name to column index mapping
+        :return: A callable returning the events values of a CPU events dict as a tuple, in column order
+        """
+        if len(event_index) == 1:
+            event_name = next(iter(event_index))
+            return lambda cpu_events: (cpu_events[event_name],)
+
+        return itemgetter(*event_index)
+
     def _gen_core_events_group(self, report):
         """
-        Generate an events group with Core events for the current socket.
-        The events value are the sum of the value for each CPU.
+        Generate the Core events values of the current socket as a vector.
+        The events values are the sum of the values of each CPU, ordered by event name.
+        The vector is computed once per report and cached alongside it, as a report is reduced
+        both for the global aggregate and for its own target power estimation.
+        The cache is keyed by socket, as the formula actors of a multi-socket host can share the same report object.
         :param report: The HWPC report of any target
-        :return: A dictionary containing the Core events of the current socket
+        :return: A vector containing the Core events values of the current socket
         """
-        core_events_group = defaultdict(int)
-        for _, cpu_events in report.groups['core'][str(self.socket)].items():
-            for event_name, event_value in {k: v for k, v in cpu_events.items() if not k.startswith('time_')}.items():
-                core_events_group[event_name] += event_value
-
-        return core_events_group
+        events_groups = getattr(report, 'core_events_groups', None)
+        if events_groups is None:
+            events_groups = {}
+            report.core_events_groups = events_groups
+        elif self.socket in events_groups:
+            return events_groups[self.socket]
+
+        cpus_events = report.groups['core'][str(self.socket)]
+        if self.event_index is None:
+            self.event_index = self._gen_event_index(next(iter(cpus_events.values())))
+            self.events_getter = self._gen_events_getter(self.event_index)
+
+        events_matrix = np.array([self.events_getter(cpu_events) for cpu_events in cpus_events.values()], dtype=np.int64)
+        events_group = _aggregate_core_events(events_matrix)
+        events_groups[self.socket] = events_group
+        return events_group
 
     def _gen_agg_core_report_from_running_targets(self, targets_report):
         """
-        Generate an aggregate Core events group of the running targets for the current socket.
-        :param targets_report: List of Core events group of the running targets
-        :return: A dictionary containing an aggregate of the Core events for the running targets of the current socket
+        Generate an aggregate Core events vector of the running targets for the current socket.
+        :param targets_report: List of HWPC reports of the running targets
+        :return: A vector containing an aggregate of the Core events values for the running targets of the current socket
         """
-        agg_core_events_group = defaultdict(int)
-        for _, target_report in targets_report.items():
-            for event_name, event_value in self._gen_core_events_group(target_report).items():
-                agg_core_events_group[event_name] += event_value
+        core_events_groups = [self._gen_core_events_group(target_report) for target_report in targets_report.values()]
+        if not core_events_groups:
+            return None
 
-        return agg_core_events_group
+        return _aggregate_core_events(np.stack(core_events_groups))
@@ -1,12 +1,16 @@
+import logging
 import os
 import threading
-import time
 from datetime import datetime
+from functools import lru_cache
 
 import openapi_client
 from dotenv import load_dotenv
 from openapi_client.api import carbon_aware_api
 
+REFRESH_INTERVAL = 4 * 60
+CACHE_BUCKET_MINUTES = 5
+
 
 class Carbon:
     load_dotenv()
@@ -15,9 +19,13 @@ class Carbon:
         self.host = host
         self.port = port
         self._configuration = self.generate_configuration()
+        self._api_client = openapi_client.ApiClient(self._configuration)
+        self._api = carbon_aware_api.CarbonAwareApi(self._api_client)
+        self._stop_event = threading.Event()
         self.emission = None
         self.get_emissions_data_here_now()
-        self._thread = threading.Thread(target=self.emission_loop)
+        self._thread = threading.Thread(target=self.emission_loop, daemon=True)
+        self._thread.start()
 
     def generate_configuration(self):
         return openapi_client.Configuration(
@@ -26,18 +34,27 @@ class Carbon:
             password=os.getenv("WATTTIME_PASSWORD"),
         )
 
+    @lru_cache(maxsize=8)
+    def _get_emissions_data(self, location, time):
+        # expensive HTTP call, memoized so identical (location, time bucket) queries skip the roundtrip
+        return self._api.get_emissions_data_for_location_by_time(
+            location=location,
+            time=time,
+        )
+
     def get_emissions_data_here_now(self):
-        api_response = None
-        with openapi_client.ApiClient(self._configuration) as api_client:
-            api_instance = carbon_aware_api.CarbonAwareApi(api_client)
-
-            api_response = api_instance.get_emissions_data_for_location_by_time(
-                location="westus",
-                time=datetime.strftime(datetime.now(), "%Y-%m-%dT%H:%MZ"),
-                # async_req=True,
-            )
+        now = datetime.now()
+        bucket = now.replace(minute=now.minute - now.minute % CACHE_BUCKET_MINUTES, second=0, microsecond=0)
+        api_response = self._get_emissions_data("westus", bucket.isoformat(timespec="minutes") + "Z")
         self.emission = api_response[0]["rating"]
 
     def emission_loop(self):
-        while True:
-            time.sleep(4 * 60)
+        while not self._stop_event.wait(REFRESH_INTERVAL):
+            try:
+                self.get_emissions_data_here_now()
+            except Exception:
+                # keep the refresh thread alive on transient API failures, the last known emission value is kept
+                logging.exception('Failed to refresh the carbon emission value, retrying in %d seconds', REFRESH_INTERVAL)
+
+    def stop(self):
+        self._stop_event.set()
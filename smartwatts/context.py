@@ -43,7 +43,8 @@ class SmartWattsFormulaConfig:
     Global config of the SmartWatts formula.
     """
 
-    def __init__(self, scope, reports_frequency, rapl_event, error_threshold, cpu_topology, min_samples_required, history_window_size, real_time_mode):
+    def __init__(self, scope, reports_frequency, rapl_event, error_threshold, cpu_topology, min_samples_required,
+                 history_window_size, real_time_mode, flush_threshold=16):
         """
         Initialize a new formula config object.
         :param scope: Scope of the formula
@@ -53,6 +54,7 @@ class SmartWattsFormulaConfig:
         :param cpu_topology: Topology of the CPU
         :param min_samples_required: Minimum amount of samples required before trying to learn a power model
         :param history_window_size: Size of the history window used to keep samples to learn from
+        :param flush_threshold: Amount of reports to buffer before flushing them to the pushers
         """
         self.scope = scope
         self.reports_frequency = reports_frequency
@@ -62,3 +64,4 @@ class SmartWattsFormulaConfig:
         self.min_samples_required = min_samples_required
         self.history_window_size = history_window_size
         self.real_time_mode = real_time_mode
+        self.flush_threshold = flush_threshold
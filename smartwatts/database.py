@@ -0,0 +1,185 @@
+# Copyright (c) 2022, INRIA
+# Copyright (c) 2022, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+from pymongo import CursorType
+
+from powerapi.database import MongoDB
+from powerapi.database.mongodb import MongoIterDB
+
+
+class SmartwattsMongoIterDB(MongoIterDB):
+    """
+    Iterator for a MongoDB database that streams sensor reports using a tailable cursor.
+    The next document is prefetched on a background worker while the current one is being processed.
+    """
+
+    def __init__(self, db, report_type, stream_mode, batch_size, max_await_time_ms):
+        """
+        :param db: Database to iterate on
+        :param report_type: Type of the report handled by the database
+        :param stream_mode: Define if reports are read continuously from the database
+        :param batch_size: Maximum amount of documents returned per batch
+        :param max_await_time_ms: Maximum amount of time (in milliseconds) the server waits for new documents on a tailable cursor
+        """
+        self.batch_size = batch_size
+        self.max_await_time_ms = max_await_time_ms
+        self.prefetch_pool = ThreadPoolExecutor(max_workers=1)
+        self.next_document = None
+        self.last_id = None
+        MongoIterDB.__init__(self, db, report_type, stream_mode)
+
+    def __iter__(self):
+        """
+        Create the iterator for get the data
+        """
+        if not self.stream_mode:
+            self.cursor = self.db.collection.find({}).batch_size(self.batch_size)
+        elif self.db.collection.options().get('capped', False):
+            self.cursor = self._open_tailable_cursor()
+        else:
+            # tailable cursors are only valid on capped collections, fallback to polling
+            self.cursor = None
+        return self
+
+    def _open_tailable_cursor(self):
+        """
+        Open a tailable cursor positioned after the last returned document, so a renewed cursor
+        does not re-deliver already processed reports.
+        :return: A tailable cursor on the collection
+        """
+        query = {} if self.last_id is None else {'_id': {'$gt': self.last_id}}
+        return self.db.collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT) \
+            .batch_size(self.batch_size) \
+            .max_await_time_ms(self.max_await_time_ms)
+
+    def _fetch_document(self):
+        """
+        Fetch the next document from the cursor.
+        This method runs on the prefetch worker so the roundtrip overlaps the processing of the previous document.
+        :return: The next document, or None when no document is available
+        """
+        try:
+            return self.cursor.next()
+        except StopIteration:
+            if self.stream_mode and not self.cursor.alive:
+                # a tailable cursor dies when it catches up an empty collection, renew it past the last processed document
+                self.cursor = self._open_tailable_cursor()
+            return None
+
+    def __next__(self):
+        """
+        Allow to get the next data
+        :raise: StopIteration in stream mode when no report was found. In non stream mode, raise StopIteration if the database is empty
+        """
+        if self.cursor is None:
+            # the polling fallback deletes the document it reads, fetch it synchronously so a prefetched document is never lost
+            json = self.db.collection.find_one_and_delete({})
+        else:
+            if self.next_document is None:
+                self.next_document = self.prefetch_pool.submit(self._fetch_document)
+            json = self.next_document.result()
+            if json is not None:
+                # track the resume point before scheduling the next fetch, a renewed cursor starts after this document
+                self.last_id = json['_id']
+            self.next_document = self.prefetch_pool.submit(self._fetch_document)
+
+        if json is None:
+            raise StopIteration()
+
+        return self.report_type.from_mongodb(json)
+
+
+class SmartwattsMongoDB(MongoDB):
+    """
+    MongoDB database that reads the sensor reports with a tailable cursor tuned for batch retrieval.
+    """
+
+    def __init__(self, report_type, uri, db_name, collection_name, batch_size=500, max_await_time_ms=500):
+        """
+        :param report_type: Type of the report handled by this database
+        :param uri: URI of the MongoDB server
+        :param db_name: Database name in the mongodb (ex: "powerapi")
+        :param collection_name: Collection name in the mongodb (ex: "sensor")
+        :param batch_size: Maximum amount of documents returned per batch
+        :param max_await_time_ms: Maximum amount of time (in milliseconds) the server waits for new documents on a tailable cursor
+        """
+        MongoDB.__init__(self, report_type, uri, db_name, collection_name)
+        self.batch_size = batch_size
+        self.max_await_time_ms = max_await_time_ms
+
+    def iter(self, stream_mode: bool) -> SmartwattsMongoIterDB:
+        """
+        Create the iterator for get the data
+        """
+        return SmartwattsMongoIterDB(self, self.report_type, stream_mode, self.batch_size, self.max_await_time_ms)
+
+
+class BufferedMongoDB(MongoDB):
+    """
+    MongoDB database that buffers the saved reports and writes them in bulk.
+    """
+
+    def __init__(self, report_type, uri, db_name, collection_name, buffer_size=100, max_buffer_latency=0.5):
+        """
+        :param report_type: Type of the report handled by this database
+        :param uri: URI of the MongoDB server
+        :param db_name: Database name in the mongodb (ex: "powerapi")
+        :param collection_name: Collection name in the mongodb (ex: "sensor")
+        :param buffer_size: Amount of reports to buffer before writing them to the database
+        :param max_buffer_latency: Maximum amount of time (in seconds) a report can stay in the buffer
+        """
+        MongoDB.__init__(self, report_type, uri, db_name, collection_name)
+        self.buffer_size = buffer_size
+        self.max_buffer_latency = max_buffer_latency
+        self.buffer = []
+        self.last_flush_time = monotonic()
+
+    def save(self, report):
+        """
+        Override from MongoDB
+
+        Buffer the report and flush the buffer to the database when it is full or too old.
+        :param report: Report to save
+        """
+        self.buffer.append(self.report_type.to_mongodb(report))
+
+        if len(self.buffer) >= self.buffer_size or (monotonic() - self.last_flush_time) >= self.max_buffer_latency:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered reports to the database in a single unordered bulk insert.
+        """
+        if self.buffer:
+            self.collection.insert_many(self.buffer, ordered=False)
+            self.buffer.clear()
+        self.last_flush_time = monotonic()
@@ -0,0 +1,71 @@
+# Copyright (c) 2022, INRIA
+# Copyright (c) 2022, University of Lille
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from powerapi.filter import Filter, RouterWithoutRuleException
+
+
+class SmartwattsFilter(Filter):
+    """
+    Filter that routes the reports with a direct report-type lookup instead of evaluating
+    a Python predicate per dispatcher per report.
+    """
+
+    def __init__(self):
+        Filter.__init__(self)
+        self.dispatchers = []
+        self.type_routes = {}
+
+    def filter(self, rule, dispatcher):
+        """
+        Register a dispatcher, the rule is kept for compatibility but never evaluated.
+        :param rule: Function returning if a report has to be sent to this dispatcher
+        :param dispatcher: Dispatcher to send the reports to
+        """
+        Filter.filter(self, rule, dispatcher)
+        self.dispatchers.append(dispatcher)
+
+    def filter_type(self, report_type, dispatcher):
+        """
+        Register a dispatcher for a report type, routed with a single dict lookup on the report class.
+        :param report_type: Type of the reports to send to this dispatcher
+        :param dispatcher: Dispatcher to send the reports to
+        """
+        self.filter(lambda _: True, dispatcher)
+        self.type_routes.setdefault(report_type, []).append(dispatcher)
+
+    def route(self, report):
+        """
+        Get the list of dispatchers to whom send the report
+        Reports of an unregistered type are sent to all dispatchers.
+        :param report: Report to route
+        """
+        if not self.dispatchers:
+            raise RouterWithoutRuleException()
+
+        return self.type_routes.get(type(report), self.dispatchers)
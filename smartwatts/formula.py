@@ -119,10 +119,14 @@ class PowerModel:
     def _extract_events_value(events):
         """
         Creates and return a list of events value from the events group.
+        Events vectors are already ordered by event name and are returned as-is.
         :param events: Events group
         :return: List containing the events value sorted by event name
         """
-        return [value for _, value in sorted(events.items())]
+        if isinstance(events, dict):
+            return [value for _, value in sorted(events.items())]
+
+        return events
 
     def store_report_in_history(self, power_reference, events):
         """